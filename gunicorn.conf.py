@@ -0,0 +1,12 @@
+# Gunicorn settings, picked up automatically from the working directory
+# (Docker CMD, run.sh and Azure App Service's default startup all run from the repo root)
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# The app is ASGI (Quart): each uvicorn worker runs one persistent event loop that
+# overlaps uploads, blob PUTs and Redis calls across requests.
+# Keep a single worker unless REDIS_URL is set; otherwise carts/donations live in process memory.
+worker_class = "uvicorn_worker.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", 1))
+timeout = 120
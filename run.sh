@@ -10,5 +10,5 @@ source venv/bin/activate
 # Install dependencies
 pip install -r requirements.txt
 
-# Run the application
-python3 src/app.py
\ No newline at end of file
+# Run the application (settings in gunicorn.conf.py)
+gunicorn application:app
\ No newline at end of file
@@ -1,10 +1,25 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
-from azure.storage.blob import BlobServiceClient
+from quart import Quart, Response, abort, g, request, jsonify, render_template, send_from_directory
+from quart.json.provider import DefaultJSONProvider
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.storage.blob.aio import BlobServiceClient
+from redis import asyncio as aioredis
+from streaming_form_data import StreamingFormDataParser
+from streaming_form_data.targets import BaseTarget, ValueTarget
+import aiohttp
+import asyncio
+import calendar
+import hashlib
+import mimetypes
+import orjson
 import os
+import shutil
+import tempfile
+import time
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import date, datetime
+from urllib.parse import quote
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
-import uuid
 
 load_dotenv()
 
@@ -12,37 +27,78 @@ load_dotenv()
 CONN_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
 CONTAINER_NAME = os.getenv("IMAGES_CONTAINER", "fooddonation")
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+ALLOWED_SUFFIXES = tuple("." + ext for ext in ALLOWED_EXTENSIONS)
+# Magic bytes of the allowed image formats (PNG, JPEG, GIF87a/89a)
+IMAGE_SIGNATURES = (b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff", b"GIF87a", b"GIF89a")
 
-# Initialize Azure storage only if connection string is provided
+# Text fields of the donate form; parsed by streaming-form-data as the body streams in
+DONATION_FIELDS = ("item_name", "category", "quantity", "expiration_date", "donor_name")
+
+# Shared upload_blob settings: upload blocks over up to 4 parallel connections
+BLOB_UPLOAD_OPTIONS = {
+    "overwrite": True,
+    "max_concurrency": 4,
+}
+
+# Initialize Azure storage only if connection string is provided.
+# The async client lives for the whole worker (created in connect_azure, since its aiohttp
+# session needs the running loop) so TLS connections stay warm across uploads.
 USE_AZURE = CONN_STRING and CONN_STRING.strip()
+AZURE_POOL_SIZE = 128  # aiohttp's default connector limit is 100
+AZURE_CLIENT_OPTIONS = {
+    # Block sizing is client-level. Anything over max_single_put_size (default 64MB, far above
+    # our 10MB cap) is read from the stream block by block instead of into one buffer.
+    "max_single_put_size": 4 * 1024 * 1024,
+    "max_block_size": 8 * 1024 * 1024,
+    "retry_total": 3,
+    "initial_backoff": 1,  # exponential: 1s + 2**attempt
+    "increment_base": 2,
+}
 bsc = None
 cc = None
 
-if USE_AZURE:
-    try:
-        bsc = BlobServiceClient.from_connection_string(CONN_STRING)
-        cc = bsc.get_container_client(CONTAINER_NAME)
-    except Exception as e:
-        print(f"Warning: Failed to initialize Azure storage: {e}")
-        USE_AZURE = False
+# Share state through Redis when REDIS_URL is provided, so multiple workers see the same carts
+REDIS_URL = os.getenv("REDIS_URL")
+USE_REDIS = REDIS_URL and REDIS_URL.strip()
+rds = None
+
+if USE_REDIS:
+    redis_pool = aioredis.ConnectionPool.from_url(REDIS_URL, max_connections=50, decode_responses=True)
+    rds = aioredis.Redis(connection_pool=redis_pool)
 
 # Setup local file storage as fallback
-UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'uploads')
+UPLOAD_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'uploads'))
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-app = Flask(__name__, template_folder=os.path.join(os.path.dirname(__file__), '..', 'templates'))
+# Internal nginx location that aliases UPLOAD_FOLDER (see nginx.conf); unset = the app serves uploads
+UPLOADS_ACCEL_PREFIX = os.getenv("UPLOADS_ACCEL_PREFIX", "").strip()
+UPLOADS_MAX_AGE = 365 * 24 * 60 * 60  # one year, for timestamped donation uploads
+BULK_IMAGES_MAX_AGE = 300  # bulk/ images are hand-placed and may be replaced; revalidate via ETag
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson, used by jsonify and request.get_json"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+app = Quart(__name__, template_folder=os.path.join(os.path.dirname(__file__), '..', 'templates'))
+app.json = OrjsonProvider(app)
 app.secret_key = "your-secret-key-change-in-production"
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10MB max
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-# In-memory databases
-donations_db = []  # Free donations from donors
+# In-memory databases (used when Redis is not configured)
+donations_by_id = {}  # Free donations from donors, keyed by id
+donations_by_donor = {}  # Normalized donor name -> {id: donation}, in posting order
 bulk_boxes_db = []  # Discounted bulk boxes ($5)
 orders_db = []  # Customer orders/carts
 users_db = {}  # Simple user tracking
 
 # Setup bulk items images directory
-BULK_IMAGES_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'uploads', 'bulk')
+BULK_IMAGES_FOLDER = os.path.join(UPLOAD_FOLDER, 'bulk')
 os.makedirs(BULK_IMAGES_FOLDER, exist_ok=True)
 
 # Global bulk items - Images should be placed in uploads/bulk/ folder
@@ -75,130 +131,193 @@ bulk_items = [
         "is_bulk": True
     }
 ]
+BULK_BY_ID = {b["id"]: b for b in bulk_items}
+
+# bulk_items never changes, so the shop JSON (and its ETag) for each category is built once at import
+def shop_body(items):
+    body = orjson.dumps({"count": len(items), "items": items, "ok": True})
+    return body, hashlib.sha256(body).hexdigest()[:16]
+
+SHOP_JSON_BY_CATEGORY = {
+    category: shop_body([item for item in bulk_items if item["category"] == category])
+    for category in {item["category"] for item in bulk_items}
+}
+SHOP_JSON_BY_CATEGORY[""] = SHOP_JSON_BY_CATEGORY["all"] = shop_body(bulk_items)
+SHOP_JSON_EMPTY = shop_body([])
+SHOP_MAX_AGE = 300  # seconds browsers may reuse /api/shop before revalidating
+
+# ============ LIFECYCLE ============
+@app.before_serving
+async def connect_azure():
+    """Create the shared Azure client with an enlarged keep-alive connection pool"""
+    global USE_AZURE, bsc, cc
+    if USE_AZURE:
+        session = None
+        try:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=AZURE_POOL_SIZE),
+                auto_decompress=False,  # the Azure transport expects raw bodies
+                trust_env=True,  # honor HTTPS_PROXY/NO_PROXY like azure-core's own session
+            )
+            transport = AioHttpTransport(session=session, session_owner=True, connection_timeout=5, read_timeout=60)
+            bsc = BlobServiceClient.from_connection_string(CONN_STRING, transport=transport, **AZURE_CLIENT_OPTIONS)
+            cc = bsc.get_container_client(CONTAINER_NAME)
+        except Exception as e:
+            print(f"Warning: Failed to initialize Azure storage: {e}")
+            USE_AZURE = False
+            bsc = cc = None
+            if session:
+                await session.close()
+
+@app.before_serving
+async def connect_redis():
+    """Check Redis once the event loop is up; fall back to in-memory storage if it's unreachable"""
+    global USE_REDIS, rds
+    if rds:
+        try:
+            await rds.ping()
+        except Exception as e:
+            print(f"Warning: Failed to connect to Redis, using in-memory storage: {e}")
+            USE_REDIS = False
+            rds = None
+
+@app.after_serving
+async def close_clients():
+    if bsc:
+        await bsc.close()
+    if rds:
+        await rds.aclose()
 
 # ============ HEALTH CHECK ============
 @app.get("/health")
-def health():
+async def health():
     return jsonify(ok=True, status="FoodBridge is running")
 
 # ============ HOMEPAGE ============
 @app.get("/")
-def index():
-    return render_template("index.html")
+async def index():
+    return await render_template("index.html")
 
 # ============ DONOR: UPLOAD FREE FOOD ============
 @app.post("/api/donate")
-def donate_food():
+async def donate_food():
     """Donor uploads unopened food for FREE distribution"""
+    uploads = []
     try:
-        item_name = request.form.get("item_name", "").strip()
-        category = request.form.get("category", "other").strip()
-        quantity = request.form.get("quantity", "").strip()
-        expiration = request.form.get("expiration_date", "").strip()
-        donor_name = request.form.get("donor_name", "Anonymous").strip().lower()
+        # Parse multipart bodies with streaming-form-data, spooling the image to disk
+        if request.mimetype == "multipart/form-data":
+            form, uploads = await parse_donation_form()
+        else:
+            form = await request.form
         
-        if not item_name or not quantity or not expiration:
-            return jsonify(ok=False, error="Missing required fields"), 400
+        fields, error = read_donation_fields(form)
+        if error:
+            return jsonify(ok=False, error=error), 400
         
-        if "file" not in request.files:
+        if not uploads:
             return jsonify(ok=False, error="No image uploaded"), 400
         
-        file = request.files["file"]
-        if file.filename == "" or not allowed_file(file.filename):
+        upload_name, tmp_path = uploads[0]
+        if not is_image_upload(upload_name, tmp_path):
             return jsonify(ok=False, error="Only image files allowed"), 400
         
         # Upload image (Azure or local)
-        filename = secure_filename(file.filename)
-        timestamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
-        safe_filename = f"{timestamp}-{filename}"
+        safe_filename = f"{compact_timestamp(now_iso())}-{secure_filename(upload_name)}"
+        [image_url] = await store_images([(tmp_path, safe_filename)])
         
-        file.seek(0)  # Reset file pointer to beginning
-        file_data = file.read()
+        # Create donation entry
+        donation = new_donation(fields, image_url)
+        await save_donation(donation)
         
-        if USE_AZURE and bsc:
-            try:
-                # Upload to Azure Blob Storage
-                blob_client = bsc.get_blob_client(CONTAINER_NAME, safe_filename)
-                blob_client.upload_blob(data=file_data, overwrite=True)
-                image_url = blob_client.url
-            except Exception as e:
-                print(f"Azure upload failed, falling back to local storage: {e}")
-                # Fallback to local storage
-                local_path = os.path.join(UPLOAD_FOLDER, safe_filename)
-                with open(local_path, 'wb') as f:
-                    f.write(file_data)
-                image_url = f"/uploads/{safe_filename}"
-        else:
-            # Use local file storage
-            local_path = os.path.join(UPLOAD_FOLDER, safe_filename)
-            with open(local_path, 'wb') as f:
-                f.write(file_data)
-            image_url = f"/uploads/{safe_filename}"
+        return jsonify(ok=True, donation=donation), 201
+    
+    except Exception as e:
+        print(f"Error donating: {e}")
+        return jsonify(ok=False, error=str(e)), 500
+    
+    finally:
+        for _, tmp_path in uploads:
+            os.remove(tmp_path)
+
+# ============ DONOR: UPLOAD FREE FOOD (MULTIPLE IMAGES) ============
+@app.post("/api/donate/bulk")
+async def donate_food_bulk():
+    """Donor uploads one item with several photos (repeated "file" parts), stored concurrently"""
+    uploads = []
+    try:
+        if request.mimetype != "multipart/form-data":
+            return jsonify(ok=False, error="No image uploaded"), 400
+        form, uploads = await parse_donation_form()
         
-        # Create donation entry
-        donation = {
-            "id": str(uuid.uuid4()),
-            "item_name": item_name,
-            "category": category,
-            "quantity": quantity,
-            "expiration_date": expiration,
-            "donor_name": donor_name,
-            "image_url": image_url,
-            "posted_at": datetime.utcnow().isoformat(),
-            "status": "available",  # available or claimed
-            "price": 0  # FREE
-        }
-        donations_db.append(donation)
+        fields, error = read_donation_fields(form)
+        if error:
+            return jsonify(ok=False, error=error), 400
+        
+        if not uploads:
+            return jsonify(ok=False, error="No image uploaded"), 400
+        
+        if not all(is_image_upload(upload_name, tmp_path) for upload_name, tmp_path in uploads):
+            return jsonify(ok=False, error="Only image files allowed"), 400
+        
+        # Index the names so two photos with the same filename don't overwrite each other
+        timestamp = compact_timestamp(now_iso())
+        image_urls = await store_images([
+            (tmp_path, f"{timestamp}-{i}-{secure_filename(upload_name)}")
+            for i, (upload_name, tmp_path) in enumerate(uploads)
+        ])
+        
+        donation = new_donation(fields, image_urls[0])
+        donation["image_urls"] = image_urls
+        await save_donation(donation)
         
         return jsonify(ok=True, donation=donation), 201
     
     except Exception as e:
         print(f"Error donating: {e}")
         return jsonify(ok=False, error=str(e)), 500
+    
+    finally:
+        for _, tmp_path in uploads:
+            os.remove(tmp_path)
 
 # ============ RECIPIENT: BROWSE SHOP ============
 @app.get("/api/shop")
-def shop():
+async def shop():
     """Recipients browse bulk boxes only (donations are separate)"""
     try:
         category = request.args.get("category", "").strip()
         
         # Only show bulk items in shop (donations are shown separately if needed)
-        shop_items = bulk_items.copy()
-        
-        # Filter by category if specified
-        if category and category != "all":
-            shop_items = [item for item in shop_items if item.get("category") == category]
-        
-        return jsonify(ok=True, items=shop_items, count=len(shop_items)), 200
+        body, etag = SHOP_JSON_BY_CATEGORY.get(category, SHOP_JSON_EMPTY)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(b"", status=304)
+        else:
+            response = Response(body, status=200, mimetype="application/json")
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = SHOP_MAX_AGE
+        return response
     
     except Exception as e:
         return jsonify(ok=False, error=str(e)), 500
 
 # ============ RECIPIENT: ADD TO CART ============
 @app.post("/api/cart/add")
-def add_to_cart():
+async def add_to_cart():
     """Add item to cart"""
     try:
-        user_id = request.form.get("user_id", str(uuid.uuid4()))
-        item_id = request.form.get("item_id")
-        quantity = int(request.form.get("quantity", 1))
+        form = await request.form
+        user_id = form.get("user_id") or new_id()
+        item_id = form.get("item_id")
+        quantity = int(form.get("quantity", 1))
         
         if not item_id:
             return jsonify(ok=False, error="Missing item_id"), 400
         
-        # Initialize user cart if not exists
-        if user_id not in users_db:
-            users_db[user_id] = {"cart": []}
-        
-        # Add item to cart
-        users_db[user_id]["cart"].append({
-            "item_id": item_id,
-            "quantity": quantity,
-            "added_at": datetime.utcnow().isoformat()
-        })
+        # Add item to cart, aggregating repeat adds of the same item
+        cart_count = await cart_add(user_id, item_id, quantity, now_iso())
         
-        return jsonify(ok=True, user_id=user_id, cart_count=len(users_db[user_id]["cart"])), 200
+        return jsonify(ok=True, user_id=user_id, cart_count=cart_count), 200
     
     except Exception as e:
         return jsonify(ok=False, error=str(e)), 500
@@ -206,27 +325,19 @@ def add_to_cart():
 # ============ RECIPIENT: REMOVE FROM CART ============
 @app.delete("/api/cart/remove")
 @app.post("/api/cart/remove")  # Also support POST for easier form submission
-def remove_from_cart():
+async def remove_from_cart():
     """Remove item from cart"""
     try:
-        # Try form data first, then JSON
-        user_id = request.form.get("user_id") or (request.json.get("user_id") if request.is_json else None)
-        item_id = request.form.get("item_id") or (request.json.get("item_id") if request.is_json else None)
+        # Try form data first, then JSON (parsed at most once)
+        data = (await request.form) or (await request.get_json(silent=True)) or {}
+        user_id = data.get("user_id")
+        item_id = data.get("item_id")
         
         if not user_id or not item_id:
             return jsonify(ok=False, error="Missing user_id or item_id"), 400
         
-        if user_id not in users_db:
-            return jsonify(ok=False, error="User not found"), 404
-        
-        # Remove first occurrence of item with matching item_id
-        original_count = len(users_db[user_id]["cart"])
-        users_db[user_id]["cart"] = [
-            item for item in users_db[user_id]["cart"] 
-            if item["item_id"] != item_id
-        ]
-        
-        if len(users_db[user_id]["cart"]) == original_count:
+        # A missing cart and a missing item look the same in both backends
+        if not await cart_remove(user_id, [item_id]):
             return jsonify(ok=False, error="Item not found in cart"), 404
         
         return jsonify(ok=True, message="Item removed from cart"), 200
@@ -236,38 +347,38 @@ def remove_from_cart():
 
 # ============ RECIPIENT: GET CART ============
 @app.get("/api/cart/<user_id>")
-def get_cart(user_id):
+async def get_cart(user_id):
     """Get user's cart"""
     try:
-        if user_id not in users_db:
+        cart = await get_cart_entries(user_id)
+        if cart is None:
             return jsonify(ok=True, cart=[], total=0), 200
         
-        cart_items = users_db[user_id]["cart"]
-        
         # Populate item details and clean up invalid items
         detailed_cart = []
         total = 0
-        valid_cart_items = []
+        orphaned_ids = []
+        donations = await get_donations([item_id for item_id in cart if item_id not in BULK_BY_ID])
         
-        for cart_item in cart_items:
+        for item_id, cart_item in cart.items():
             # Find item in donations or bulk
-            item = next((d for d in donations_db if d["id"] == cart_item["item_id"]), None)
-            if not item:
-                item = next((b for b in bulk_items if b["id"] == cart_item["item_id"]), None)
+            item = donations.get(item_id) or BULK_BY_ID.get(item_id)
             
             if item:
                 detailed_cart.append({
-                    "item_id": cart_item["item_id"],
+                    "item_id": item_id,
                     "item_name": item.get("item_name"),
                     "price": item.get("price", 0),
                     "quantity": cart_item["quantity"],
                     "subtotal": cart_item["quantity"] * item.get("price", 0)
                 })
                 total += cart_item["quantity"] * item.get("price", 0)
-                valid_cart_items.append(cart_item)
+            else:
+                orphaned_ids.append(item_id)
         
-        # Update cart to only include valid items (clean up orphaned items)
-        users_db[user_id]["cart"] = valid_cart_items
+        # Drop items that no longer exist (clean up orphaned items)
+        if orphaned_ids:
+            await cart_remove(user_id, orphaned_ids)
         
         return jsonify(ok=True, cart=detailed_cart, total=total), 200
     
@@ -276,37 +387,37 @@ def get_cart(user_id):
 
 # ============ RECIPIENT: CHECKOUT ============
 @app.post("/api/checkout")
-def checkout():
+async def checkout():
     """Finalize order with pickup/delivery choice"""
     try:
-        user_id = request.form.get("user_id")
-        recipient_name = request.form.get("recipient_name", "").strip()
-        phone = request.form.get("phone", "").strip()
-        pickup_option = request.form.get("pickup_option")  # "pickup" or "delivery"
-        preferred_date = request.form.get("preferred_date", "").strip()
+        form = await request.form
+        user_id = form.get("user_id")
+        recipient_name = form.get("recipient_name", "").strip()
+        phone = form.get("phone", "").strip()
+        pickup_option = form.get("pickup_option")  # "pickup" or "delivery"
+        preferred_date = form.get("preferred_date", "").strip()
         
         if not user_id or not recipient_name or not phone or not pickup_option:
             return jsonify(ok=False, error="Missing required fields"), 400
         
-        if user_id not in users_db or not users_db[user_id]["cart"]:
+        # Take the cart atomically so a double submit can't place the same order twice
+        cart = await take_cart(user_id)
+        if not cart:
             return jsonify(ok=False, error="Cart is empty"), 400
         
         # Create order
         order = {
-            "order_id": str(uuid.uuid4()),
+            "order_id": new_id(),
             "user_id": user_id,
             "recipient_name": recipient_name,
             "phone": phone,
-            "items": users_db[user_id]["cart"],
+            "items": [{"item_id": item_id, **entry} for item_id, entry in cart.items()],
             "pickup_option": pickup_option,
             "preferred_date": preferred_date,
             "status": "scheduled",  # scheduled, ready, completed
-            "created_at": datetime.utcnow().isoformat()
+            "created_at": now_iso()
         }
-        orders_db.append(order)
-        
-        # Clear cart
-        users_db[user_id]["cart"] = []
+        await save_order(order)
         
         return jsonify(ok=True, order=order, message="Order scheduled! Check back for updates."), 201
     
@@ -315,11 +426,11 @@ def checkout():
 
 # ============ DONOR: VIEW DONATIONS ============
 @app.get("/api/my-donations/<donor_name>")
-def get_my_donations(donor_name):
+async def get_my_donations(donor_name):
     """Donor sees their donations"""
     try:
         normalized = (donor_name or "").strip().lower()
-        my_items = [d for d in donations_db if d.get("donor_name", "").strip().lower() == normalized]
+        my_items = await get_donor_donations(normalized)
         return jsonify(ok=True, items=my_items, count=len(my_items)), 200
     
     except Exception as e:
@@ -327,14 +438,10 @@ def get_my_donations(donor_name):
 
 # ============ DONOR: REMOVE DONATION ============
 @app.delete("/api/donation/<donation_id>")
-def delete_donation(donation_id):
+async def delete_donation(donation_id):
     """Donor removes their donation"""
     try:
-        global donations_db
-        original_count = len(donations_db)
-        donations_db = [d for d in donations_db if d["id"] != donation_id]
-        
-        if len(donations_db) == original_count:
+        if not await remove_donation(donation_id):
             return jsonify(ok=False, error="Donation not found"), 404
         
         return jsonify(ok=True, message="Donation removed"), 200
@@ -344,19 +451,295 @@ def delete_donation(donation_id):
 
 # ============ STATIC FILE SERVING ============
 @app.route('/uploads/<path:filename>')
-def uploaded_file(filename):
+async def uploaded_file(filename):
     """Serve uploaded images from local storage (supports nested paths like bulk/)"""
-    # Handle nested paths like bulk/image.jpg
-    if '/' in filename:
-        folder, file = filename.rsplit('/', 1)
-        folder_path = os.path.join(UPLOAD_FOLDER, folder)
-        return send_from_directory(folder_path, file)
+    # Behind nginx, hand the file off with X-Accel-Redirect so it's sent with sendfile
+    if UPLOADS_ACCEL_PREFIX:
+        if safe_join(UPLOAD_FOLDER, filename) is None:
+            abort(404)
+        # nginx keeps the upstream Content-Type on an internal redirect, so set the real one
+        response = Response(
+            b"",
+            mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+            headers={"X-Accel-Redirect": UPLOADS_ACCEL_PREFIX + quote(filename)},
+        )
+    else:
+        # safe_join inside send_from_directory already handles nested paths like bulk/image.jpg
+        response = await send_from_directory(UPLOAD_FOLDER, filename)
+    
+    response.cache_control.public = True
+    if filename.startswith("bulk/"):
+        # Fixed names that admins replace in place; the ETag lets browsers revalidate cheaply
+        response.cache_control.max_age = BULK_IMAGES_MAX_AGE
+    else:
+        # Donation upload names carry a timestamp, so a given URL never changes content
+        response.cache_control.max_age = UPLOADS_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+# ============ STORAGE ============
+# Every read/write of donations, carts and orders goes through these helpers so the
+# Redis and in-memory backends stay interchangeable.
+
+async def save_donation(donation):
+    if rds:
+        pipe = rds.pipeline()
+        pipe.hset("donations", donation["id"], orjson.dumps(donation))
+        pipe.zadd(f"donor:{donation['donor_name']}", {donation["id"]: time.time()})
+        await pipe.execute()
+    else:
+        donations_by_id[donation["id"]] = donation
+        donations_by_donor.setdefault(donation["donor_name"], {})[donation["id"]] = donation
+
+async def get_donations(donation_ids):
+    """Look up several donations at once; returns {id: donation} for the ones that exist"""
+    if rds:
+        if not donation_ids:
+            return {}
+        raw = await rds.hmget("donations", donation_ids)
+        return {donation_id: orjson.loads(d) for donation_id, d in zip(donation_ids, raw) if d}
+    return {donation_id: donations_by_id[donation_id] for donation_id in donation_ids if donation_id in donations_by_id}
+
+async def get_donor_donations(donor_name):
+    """Donations posted by a normalized donor name, oldest first"""
+    if rds:
+        return list((await get_donations(await rds.zrange(f"donor:{donor_name}", 0, -1))).values())
+    return list(donations_by_donor.get(donor_name, {}).values())
+
+async def remove_donation(donation_id):
+    """Delete a donation; returns False if it didn't exist"""
+    if rds:
+        raw = await rds.hget("donations", donation_id)
+        if raw is None:
+            return False
+        pipe = rds.pipeline()
+        pipe.hdel("donations", donation_id)
+        pipe.zrem(f"donor:{orjson.loads(raw)['donor_name']}", donation_id)
+        await pipe.execute()
+        return True
+    
+    donation = donations_by_id.pop(donation_id, None)
+    if donation is None:
+        return False
+    donor_items = donations_by_donor.get(donation["donor_name"], {})
+    donor_items.pop(donation_id, None)
+    if not donor_items:
+        donations_by_donor.pop(donation["donor_name"], None)
+    return True
+
+async def cart_add(user_id, item_id, quantity, added_at):
+    """Add quantity of item_id to the user's cart; returns the number of distinct items"""
+    if rds:
+        pipe = rds.pipeline()
+        pipe.hincrby(f"cart:{user_id}", item_id, quantity)
+        pipe.hsetnx(f"cart_added:{user_id}", item_id, added_at)
+        pipe.hlen(f"cart:{user_id}")
+        return (await pipe.execute())[-1]
+    
+    # Initialize user cart if not exists
+    if user_id not in users_db:
+        users_db[user_id] = {"cart": {}}
+    cart = users_db[user_id]["cart"]
+    entry = cart.setdefault(item_id, {"quantity": 0, "added_at": added_at})
+    entry["quantity"] += quantity
+    return len(cart)
+
+async def get_cart_entries(user_id):
+    """The user's cart as {item_id: {"quantity", "added_at"}}, or None if it's missing or empty"""
+    if rds:
+        pipe = rds.pipeline()
+        pipe.hgetall(f"cart:{user_id}")
+        pipe.hgetall(f"cart_added:{user_id}")
+        quantities, added = await pipe.execute()
+        if not quantities:
+            return None
+        return {
+            item_id: {"quantity": int(quantity), "added_at": added.get(item_id)}
+            for item_id, quantity in quantities.items()
+        }
+    
+    if user_id not in users_db or not users_db[user_id]["cart"]:
+        return None
+    return users_db[user_id]["cart"]
+
+async def cart_remove(user_id, item_ids):
+    """Remove items from the user's cart; returns how many were actually removed"""
+    if rds:
+        pipe = rds.pipeline()
+        pipe.hdel(f"cart:{user_id}", *item_ids)
+        pipe.hdel(f"cart_added:{user_id}", *item_ids)
+        return (await pipe.execute())[0]
+    
+    cart = users_db.get(user_id, {}).get("cart", {})
+    return sum(cart.pop(item_id, None) is not None for item_id in item_ids)
+
+async def take_cart(user_id):
+    """Empty the user's cart and return what was in it"""
+    if rds:
+        pipe = rds.pipeline()  # MULTI/EXEC, so the read and delete are atomic
+        pipe.hgetall(f"cart:{user_id}")
+        pipe.hgetall(f"cart_added:{user_id}")
+        pipe.delete(f"cart:{user_id}", f"cart_added:{user_id}")
+        quantities, added, _ = await pipe.execute()
+        return {
+            item_id: {"quantity": int(quantity), "added_at": added.get(item_id)}
+            for item_id, quantity in quantities.items()
+        }
+    
+    if user_id not in users_db:
+        return {}
+    cart = users_db[user_id]["cart"]
+    users_db[user_id]["cart"] = {}
+    return cart
+
+async def save_order(order):
+    if rds:
+        await rds.rpush("orders", orjson.dumps(order))
     else:
-        return send_from_directory(UPLOAD_FOLDER, filename)
+        orders_db.append(order)
 
 # ============ HELPER ============
 def allowed_file(filename):
-    return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(ALLOWED_SUFFIXES)
+
+def new_id():
+    """Time-ordered UUIDv7 string (48-bit ms timestamp + 74 random bits), so ids sort by creation"""
+    ms = time.time_ns() // 1_000_000
+    rand = int.from_bytes(os.urandom(10), "big")
+    value = (ms << 80) | (0x7 << 76) | (((rand >> 62) & 0xFFF) << 64) | (0b10 << 62) | (rand & ((1 << 62) - 1))
+    h = f"{value:032x}"
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+def now_iso():
+    """Current UTC time in ISO format, computed at most once per request"""
+    if "now_iso" not in g:
+        g.now_iso = datetime.utcnow().isoformat()
+    return g.now_iso
+
+def compact_timestamp(iso):
+    """2024-01-02T03:04:05.678 -> 20240102T030405 (same as strftime("%Y%m%dT%H%M%S"))"""
+    return iso[:19].replace("-", "").replace(":", "")
+
+class SpooledFilesTarget(BaseTarget):
+    """streaming-form-data target that spools each part it receives to its own temp file.
+    
+    uploads holds [upload filename, temp path] pairs in arrival order.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.uploads = []
+        self._out = None
+    
+    def on_start(self):
+        fd, tmp_path = tempfile.mkstemp(prefix="donation-")
+        self._out = os.fdopen(fd, 'wb')
+        self.uploads.append([self.multipart_filename, tmp_path])
+    
+    def on_data_received(self, chunk):
+        self._out.write(chunk)
+    
+    def on_finish(self):
+        self._out.close()
+        self.uploads[-1][0] = self.multipart_filename
+    
+    def discard(self):
+        """Close and delete everything spooled so far (used when parsing fails)"""
+        if self._out:
+            self._out.close()
+        for _, tmp_path in self.uploads:
+            os.remove(tmp_path)
+
+async def parse_donation_form():
+    """Parse the donate form from the request body with streaming-form-data as it arrives.
+    
+    Returns (fields, uploads) where uploads is a list of (upload filename, temp path)
+    for each "file" part. The caller removes the temp files.
+    """
+    parser = StreamingFormDataParser(headers=request.headers)
+    values = {name: ValueTarget() for name in DONATION_FIELDS}
+    for name, target in values.items():
+        parser.register(name, target)
+    files = SpooledFilesTarget()
+    parser.register("file", files)
+    
+    # Anything that fails before we hand back the uploads (including decoding) must discard them
+    try:
+        async for chunk in request.body:
+            parser.data_received(chunk)
+        fields = {name: target.value.decode("utf-8") for name, target in values.items() if target.value}
+    except Exception:
+        files.discard()
+        raise
+    
+    return fields, [tuple(upload) for upload in files.uploads]
+
+def read_donation_fields(form):
+    """Normalized donation fields from a form, as (fields, error message or None)"""
+    fields = {
+        "item_name": form.get("item_name", "").strip(),
+        "category": form.get("category", "other").strip(),
+        "quantity": form.get("quantity", "").strip(),
+        "expiration_date": form.get("expiration_date", "").strip(),
+        "donor_name": form.get("donor_name", "Anonymous").strip().lower(),
+    }
+    if not fields["item_name"] or not fields["quantity"] or not fields["expiration_date"]:
+        return None, "Missing required fields"
+    
+    # Parse the date once here so expiry filters never re-parse strings
+    try:
+        expires = date.fromisoformat(fields["expiration_date"])
+    except ValueError:
+        return None, "Invalid expiration_date (expected YYYY-MM-DD)"
+    fields["expires_at_epoch"] = calendar.timegm(expires.timetuple())
+    return fields, None
+
+def new_donation(fields, image_url):
+    return {
+        "id": new_id(),
+        **fields,
+        "image_url": image_url,
+        "posted_at": now_iso(),
+        "status": "available",  # available or claimed
+        "price": 0  # FREE
+    }
+
+def is_image_upload(upload_name, tmp_path):
+    """Check a spooled upload's extension, then its magic bytes"""
+    if not upload_name or not allowed_file(upload_name):
+        return False
+    with open(tmp_path, 'rb') as f:
+        return f.read(12).startswith(IMAGE_SIGNATURES)
+
+async def store_images(uploads):
+    """Store (temp path, safe filename) uploads concurrently; returns their URLs in order.
+    
+    Any upload that fails to reach Azure falls back to local storage on its own.
+    """
+    return await asyncio.gather(*(store_image(*upload) for upload in uploads))
+
+async def store_image(tmp_path, safe_filename):
+    # Stream the spooled file straight through instead of reading it into memory.
+    # Local-disk I/O (here, in the parser's temp files and in save_local) is done inline:
+    # it's short and bounded by the 10MB cap, unlike the network PUTs we await.
+    with open(tmp_path, 'rb') as stream:
+        if USE_AZURE and bsc:
+            try:
+                # Upload to Azure Blob Storage without blocking the event loop on the PUTs
+                blob_client = bsc.get_blob_client(CONTAINER_NAME, safe_filename)
+                await blob_client.upload_blob(data=stream, **BLOB_UPLOAD_OPTIONS)
+                return blob_client.url
+            except Exception as e:
+                print(f"Azure upload failed, falling back to local storage: {e}")
+        return save_local(stream, safe_filename)
+
+def save_local(stream, safe_filename):
+    """Copy an upload stream to local storage in 1MB chunks and return its URL"""
+    stream.seek(0)
+    local_path = os.path.join(UPLOAD_FOLDER, safe_filename)
+    with open(local_path, 'wb') as out:
+        shutil.copyfileobj(stream, out, length=1024 * 1024)
+    return f"/uploads/{safe_filename}"
 
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
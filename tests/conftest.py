@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make `src.app` importable the same way application.py imports it
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -0,0 +1,228 @@
+import asyncio
+import tempfile
+
+import fakeredis
+import pytest
+
+from src import app as app_module
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+BOUNDARY = "foodbridge-test-boundary"
+DONATION = {
+    "item_name": "Canned Beans",
+    "category": "canned",
+    "quantity": "4 cans",
+    "expiration_date": "2030-01-31",
+    "donor_name": "Test Donor",
+}
+
+
+@pytest.fixture
+def fresh_app(monkeypatch, tmp_path):
+    """Local storage in tmp_path, no Azure, and empty in-memory databases"""
+    monkeypatch.setattr(app_module, "USE_AZURE", False)
+    monkeypatch.setattr(app_module, "bsc", None)
+    monkeypatch.setattr(app_module, "rds", None)
+    monkeypatch.setattr(app_module, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setattr(app_module, "UPLOADS_ACCEL_PREFIX", "")
+    monkeypatch.setattr(app_module, "donations_by_id", {})
+    monkeypatch.setattr(app_module, "donations_by_donor", {})
+    monkeypatch.setattr(app_module, "orders_db", [])
+    monkeypatch.setattr(app_module, "users_db", {})
+    return app_module
+
+
+def run(backend, scenario):
+    """Run scenario(client) on a fresh event loop, against fakeredis or the in-memory store"""
+    async def main():
+        if backend == "redis":
+            app_module.rds = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        await scenario(app_module.app.test_client())
+    asyncio.run(main())
+
+
+def multipart(fields, files=()):
+    """Encode fields (str or raw bytes) and (filename, content) pairs sent as repeated "file" parts"""
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode()
+            + (value if isinstance(value, bytes) else value.encode()) + b"\r\n"
+        )
+    for filename, content in files:
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n".encode()
+            + content + b"\r\n"
+        )
+    body = b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+    return body, {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+
+
+# ============ DONATE ============
+@pytest.mark.parametrize("backend", ["memory", "redis"])
+def test_donate_stores_image_and_lists_it(fresh_app, tmp_path, backend):
+    async def scenario(client):
+        body, headers = multipart(DONATION, [("beans.png", PNG)])
+        r = await client.post("/api/donate", data=body, headers=headers)
+        assert r.status_code == 201
+        donation = (await r.get_json())["donation"]
+        assert donation["donor_name"] == "test donor"
+        assert donation["image_url"].startswith("/uploads/")
+        assert (tmp_path / donation["image_url"].rsplit("/", 1)[1]).read_bytes() == PNG
+        
+        r = await client.get("/api/my-donations/test%20donor")
+        assert [d["id"] for d in (await r.get_json())["items"]] == [donation["id"]]
+        
+        r = await client.delete(f"/api/donation/{donation['id']}")
+        assert r.status_code == 200
+        r = await client.get("/api/my-donations/test%20donor")
+        assert (await r.get_json())["count"] == 0
+    run(backend, scenario)
+
+
+def test_donate_rejects_bad_magic_bytes(fresh_app, tmp_path):
+    async def scenario(client):
+        body, headers = multipart(DONATION, [("beans.png", b"definitely not a png")])
+        r = await client.post("/api/donate", data=body, headers=headers)
+        assert r.status_code == 400
+        assert (await r.get_json())["error"] == "Only image files allowed"
+        assert list(tmp_path.iterdir()) == []
+    run("memory", scenario)
+
+
+@pytest.fixture
+def spool_dir(monkeypatch, tmp_path):
+    """Send parser temp files to their own directory so leaks are visible"""
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(spool))
+    return spool
+
+
+def test_donate_bad_utf8_field_leaves_no_temp_file(fresh_app, spool_dir):
+    async def scenario(client):
+        body, headers = multipart({**DONATION, "item_name": b"\xff\xfe"}, [("beans.png", PNG)])
+        r = await client.post("/api/donate", data=body, headers=headers)
+        assert r.status_code == 500
+        assert list(spool_dir.iterdir()) == []
+    run("memory", scenario)
+
+
+def test_donate_bulk_bad_utf8_field_leaves_no_temp_files(fresh_app, spool_dir):
+    async def scenario(client):
+        body, headers = multipart({**DONATION, "item_name": b"\xff\xfe"}, [("a.png", PNG), ("b.png", PNG)])
+        r = await client.post("/api/donate/bulk", data=body, headers=headers)
+        assert r.status_code == 500
+        assert list(spool_dir.iterdir()) == []
+    run("memory", scenario)
+
+
+def test_donate_requires_file_part(fresh_app):
+    async def scenario(client):
+        body, headers = multipart(DONATION)
+        r = await client.post("/api/donate", data=body, headers=headers)
+        assert r.status_code == 400
+        assert (await r.get_json())["error"] == "No image uploaded"
+    run("memory", scenario)
+
+
+def test_donate_bulk_stores_every_image(fresh_app):
+    async def scenario(client):
+        body, headers = multipart(DONATION, [("a.png", PNG), ("a.png", PNG)])
+        r = await client.post("/api/donate/bulk", data=body, headers=headers)
+        assert r.status_code == 201
+        image_urls = (await r.get_json())["donation"]["image_urls"]
+        assert len(set(image_urls)) == 2
+    run("memory", scenario)
+
+
+# ============ CART ============
+@pytest.mark.parametrize("backend", ["memory", "redis"])
+def test_cart_add_get_remove_checkout(fresh_app, backend):
+    async def scenario(client):
+        for item_id in ("bulk-1", "bulk-1", "bulk-2"):
+            r = await client.post("/api/cart/add", form={"user_id": "u1", "item_id": item_id})
+            assert r.status_code == 200
+        assert (await r.get_json())["cart_count"] == 2
+        
+        r = await client.get("/api/cart/u1")
+        data = await r.get_json()
+        assert {i["item_id"]: i["quantity"] for i in data["cart"]} == {"bulk-1": 2, "bulk-2": 1}
+        assert data["total"] == 15
+        
+        r = await client.post("/api/cart/remove", form={"user_id": "u1", "item_id": "bulk-2"})
+        assert r.status_code == 200
+        r = await client.post("/api/cart/remove", form={"user_id": "u1", "item_id": "bulk-2"})
+        assert r.status_code == 404
+        
+        r = await client.post("/api/checkout", form={
+            "user_id": "u1", "recipient_name": "Sam", "phone": "555", "pickup_option": "pickup",
+        })
+        assert r.status_code == 201
+        order = (await r.get_json())["order"]
+        assert [(i["item_id"], i["quantity"]) for i in order["items"]] == [("bulk-1", 2)]
+        
+        r = await client.get("/api/cart/u1")
+        assert (await r.get_json())["cart"] == []
+        
+        # Same answer from both backends once the cart is gone
+        r = await client.post("/api/cart/remove", json={"user_id": "u1", "item_id": "bulk-1"})
+        assert r.status_code == 404
+        assert (await r.get_json())["error"] == "Item not found in cart"
+        
+        r = await client.post("/api/checkout", form={
+            "user_id": "u1", "recipient_name": "Sam", "phone": "555", "pickup_option": "pickup",
+        })
+        assert r.status_code == 400
+    run(backend, scenario)
+
+
+# ============ SHOP ============
+def test_shop_returns_304_for_matching_etag(fresh_app):
+    async def scenario(client):
+        r = await client.get("/api/shop")
+        assert r.status_code == 200
+        assert (await r.get_json())["count"] == 3
+        assert "max-age=300" in r.headers["Cache-Control"]
+        etag = r.headers["ETag"]
+        
+        r = await client.get("/api/shop", headers={"If-None-Match": etag})
+        assert r.status_code == 304
+        assert await r.get_data() == b""
+        
+        r = await client.get("/api/shop?category=dairy", headers={"If-None-Match": etag})
+        assert r.status_code == 200
+        assert (await r.get_json())["count"] == 1
+    run("memory", scenario)
+
+
+# ============ UPLOADS ============
+def test_uploads_cache_headers(fresh_app, tmp_path):
+    (tmp_path / "20240101T000000-beans.png").write_bytes(PNG)
+    (tmp_path / "bulk").mkdir()
+    (tmp_path / "bulk" / "dairy_bundle.jpg").write_bytes(b"\xff\xd8\xff")
+    
+    async def scenario(client):
+        r = await client.get("/uploads/20240101T000000-beans.png")
+        assert r.status_code == 200
+        assert await r.get_data() == PNG
+        assert "immutable" in r.headers["Cache-Control"]
+        assert "max-age=31536000" in r.headers["Cache-Control"]
+        
+        r = await client.get("/uploads/bulk/dairy_bundle.jpg")
+        assert r.status_code == 200
+        assert "immutable" not in r.headers["Cache-Control"]
+        assert "max-age=300" in r.headers["Cache-Control"]
+        assert "ETag" in r.headers
+    run("memory", scenario)
+
+
+def test_uploads_x_accel_redirect(fresh_app, monkeypatch):
+    monkeypatch.setattr(app_module, "UPLOADS_ACCEL_PREFIX", "/protected-uploads/")
+    
+    async def scenario(client):
+        r = await client.get("/uploads/bulk/my%20photo.png")
+        assert r.headers["X-Accel-Redirect"] == "/protected-uploads/bulk/my%20photo.png"
+        assert r.mimetype == "image/png"
+    run("memory", scenario)